@@ -2,12 +2,15 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import requests
-import yfinance as yf
-from bs4 import BeautifulSoup
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import plotly.graph_objects as go
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import re
 import time
 import datetime
+import functools
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import xml.etree.ElementTree as ET
 
 # --- 🎨 PRO CONFIGURATION ---
@@ -85,7 +88,38 @@ st.markdown("""
 # --- 🛠️ DATA ENGINE (JAN 2026 SNAPSHOT) ---
 # We use realistic 2026 data as a robust fallback if live APIs fail
 
-@st.cache_data
+# Calls returning faster than this are counted as probable cache hits
+CACHE_HIT_SECS = 0.005
+
+def get_cache_log():
+    """
+    This session's (function name, seconds, raised) log of recent cached calls.
+    """
+    return st.session_state.setdefault("_cache_log", deque(maxlen=1000))
+
+def track_cache_stats(fn):
+    """
+    Times each call of a cached function into the cache log, so a key that
+    silently misses on every rerun shows up in the sidebar's Cache stats.
+    """
+    name = getattr(fn, "__name__", repr(fn))
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start, raised = time.perf_counter(), True
+        try:
+            result = fn(*args, **kwargs)
+            raised = False
+            return result
+        finally:
+            get_cache_log().append((name, time.perf_counter() - start, raised))
+
+    # Keep the cache's own API (e.g. fetch_news_sentiment.clear()) reachable
+    wrapper.clear = fn.clear
+    return wrapper
+
+@track_cache_stats
+@st.cache_resource
 def load_ipo_data():
     """
     Returns verified IPO data for January 2026.
@@ -139,39 +173,213 @@ def load_ipo_data():
         }
     ]
     
-    return pd.DataFrame(mainboard), pd.DataFrame(sme)
+    mainboard_df, sme_df = pd.DataFrame(mainboard), pd.DataFrame(sme)
+    
+    # Derived GMP columns, computed column-wise instead of per card
+    for df in (mainboard_df, sme_df):
+        gmp = df["GMP"].to_numpy(np.float64)
+        price = df["Price"].to_numpy(np.float64)
+        df["Est_Price"] = df["Price"] + df["GMP"]
+        df["GMP_Pct"] = np.divide(gmp, price, out=np.zeros_like(gmp), where=price > 0) * 100
+        df["Lot_Profit"] = df["GMP"] * df["Lot"]
+    
+    return mainboard_df, sme_df
 
-@st.cache_data(ttl=900)
-def get_news_sentiment(query):
+# Company suffixes dropped from news queries, stripped in a single pass
+COMPANY_SUFFIX_RE = re.compile(r"Ltd|Limited")
+
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    """
+    Shared keep-alive session so repeated RSS fetches reuse pooled
+    connections instead of a fresh TCP+TLS handshake per request.
+    """
+    session = requests.Session()
+    session.headers.update({"User-Agent": "Mozilla/5.0"})
+    # Only a failed connect is retried, once. Slow reads and 5xx/429 answers
+    # (Retry-After included) fail straight through to the breaker and backoff
+    retry = Retry(total=1, connect=1, read=0, status=0, respect_retry_after_header=False)
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+# Seconds to skip a query's RSS fetch after it failed (e.g. Google 429)
+RSS_BACKOFF_SECS = 60
+
+# Seconds a cached "no coverage" result is trusted, well under the 15 min TTL
+RSS_EMPTY_SECS = 120
+
+# Queries are free text, so per-query state keeps only the most recent ones
+RSS_MAX_QUERIES = 256
+
+def remember(store, key, value, maxlen):
+    """
+    Sets key in an OrderedDict as its newest entry, evicting the oldest
+    entries beyond maxlen. Safe to call from several threads at once.
+    """
+    store.pop(key, None)
+    store[key] = value
+    while len(store) > maxlen:
+        try:
+            store.popitem(last=False)
+        except KeyError:
+            break
+
+@st.cache_resource(show_spinner=False)
+def get_rss_backoff():
+    """
+    Process-wide {query: last failure time} map that survives reruns.
+    """
+    return OrderedDict()
+
+# Circuit breaker: this many feed failures within RSS_BACKOFF_SECS pause
+# all Google News fetches until the oldest of them ages out of the window
+RSS_BREAKER_FAILS = 3
+
+@st.cache_resource(show_spinner=False)
+def get_rss_failures():
+    """
+    Timestamps of the most recent feed failures across all queries.
+    """
+    return deque(maxlen=RSS_BREAKER_FAILS)
+
+# Seconds a last-good report may stand in for a failed refresh
+RSS_STALE_SECS = 2 * 60 * 60
+
+@st.cache_resource(show_spinner=False)
+def get_last_good_sentiment():
+    """
+    Process-wide {query: report} of the last successful fetch.
+    """
+    return OrderedDict()
+
+@st.cache_resource(show_spinner=False)
+def get_title_scorer():
+    """
+    Returns a memoized title -> VADER compound score function. The analyzer
+    (and its lexicon) is built once per process; repeated headlines are free.
+    """
+    # Imported here so pages without news never pay for loading VADER
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    analyzer = SentimentIntensityAnalyzer()
+
+    # VADER's per-word work grows with text length, so an oversized or
+    # spammy title is capped before scoring; real headlines fit well within it
+    @functools.lru_cache(maxsize=4096)
+    def score_title(title):
+        return analyzer.polarity_scores(title[:200])['compound']
+
+    return score_title
+
+@track_cache_stats
+@st.cache_data(ttl=900, show_spinner=False)
+def fetch_news_sentiment(query):
     """
     Fetches real news via Google RSS and calculates sentiment.
+    Network/parse errors propagate so that failures are never cached.
     """
-    clean_query = query.replace("Ltd", "").replace("Limited", "").strip()
+    clean_query = COMPANY_SUFFIX_RE.sub("", query).strip()
     rss_url = f"https://news.google.com/rss/search?q={clean_query}+india+business&hl=en-IN&gl=IN&ceid=IN:en"
     
-    analyzer = SentimentIntensityAnalyzer()
-    news_items = []
+    failures = get_rss_failures()
+    # Check a snapshot: other threads append to and clear the deque concurrently
+    recent = tuple(failures)
+    if len(recent) == RSS_BREAKER_FAILS and time.time() - recent[0] < RSS_BACKOFF_SECS:
+        raise requests.ConnectionError("Google News circuit breaker is open")
     
     try:
-        r = requests.get(rss_url, timeout=5)
+        # Worst case per query: a 2s connect timeout, its single retry (see
+        # get_http_session) and one 3s read, i.e. about 7s; 5xx is never retried
+        r = get_http_session().get(rss_url, timeout=(2, 3))
+        r.raise_for_status()
         root = ET.fromstring(r.content)
-        for item in root.findall('./channel/item')[:5]:
-            title = item.find('title').text
-            link = item.find('link').text
-            pubDate = item.find('pubDate').text
-            score = analyzer.polarity_scores(title)['compound']
-            news_items.append({"Title": title, "Link": link, "Date": pubDate, "Score": score})
-    except:
-        return []
-
-    if not news_items: return None
-
-    avg_score = sum(x['Score'] for x in news_items) / len(news_items)
+    except (requests.RequestException, ET.ParseError):
+        failures.append(time.time())
+        raise
+    failures.clear()
+    
+    # Syndicated stories often repeat a headline; keep the first copy of
+    # each so duplicates aren't scored twice or double-counted in the average.
+    # Untitled items are skipped rather than scored as a neutral 0.0
+    items, seen = {}, set()
+    for item in root.iterfind('./channel/item'):
+        title = item.findtext('title', "")
+        key = title.strip().casefold()
+        if key and key not in seen:
+            seen.add(key)
+            items[title] = (item.findtext('link', ""), item.findtext('pubDate', ""))
+            if len(items) == 5: break
+
+    # Cache "no coverage" too, so low-coverage tickers don't refetch every
+    # rerun; get_news_sentiment retires it after RSS_EMPTY_SECS
+    if not items: return {"status": "empty", "fetched_at": time.time()}
+
+    # Score all titles in one pass once parsing is done
+    score_title = get_title_scorer()
+    scores = [score_title(title) for title in items]
+    news_items = [{"Title": title, "Link": link, "Date": pubDate, "Score": score}
+                  for (title, (link, pubDate)), score in zip(items.items(), scores)]
+
+    avg_score = sum(scores) / len(scores)
     rating = "Neutral ⚖️"
     if avg_score > 0.3: rating = "Positive 🟢"
     elif avg_score < -0.3: rating = "Negative 🔴"
     
-    return {"rating": rating, "score": int((avg_score+1)*50), "news": news_items}
+    return {"status": "ok", "rating": rating, "score": int((avg_score+1)*50), "news": news_items,
+            "fetched_at": time.time()}
+
+def get_news_sentiment(query):
+    """
+    Returns the cached sentiment report for a query. After a failed fetch
+    the query is skipped for RSS_BACKOFF_SECS instead of retried on every rerun,
+    and the last good report (flagged stale) is served in the meantime.
+    """
+    backoff = get_rss_backoff()
+    last_good = get_last_good_sentiment()
+    
+    if time.time() - backoff.get(query, 0) >= RSS_BACKOFF_SECS:
+        try:
+            report = fetch_news_sentiment(query)
+            if report["status"] == "empty" and time.time() - report["fetched_at"] >= RSS_EMPTY_SECS:
+                fetch_news_sentiment.clear(query)
+                report = fetch_news_sentiment(query)
+            remember(last_good, query, report, RSS_MAX_QUERIES)
+            return report
+        except (requests.RequestException, ET.ParseError):
+            remember(backoff, query, time.time(), RSS_MAX_QUERIES)
+    
+    report = last_good.get(query)
+    if report and time.time() - report["fetched_at"] < RSS_STALE_SECS:
+        return {**report, "stale": True}
+    return {"status": "error"}
+
+def prefetch_news_sentiment(queries):
+    """
+    Runs the (network-bound) sentiment lookups for several queries
+    concurrently and returns them keyed by query.
+    """
+    # Workers carry this run's script context so their cached calls are
+    # logged to the visitor's own session
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=4, initializer=add_script_run_ctx, initargs=(None, ctx)) as ex:
+        return dict(zip(queries, ex.map(get_news_sentiment, queries)))
+
+@track_cache_stats
+@st.cache_resource
+def load_fund_data():
+    """
+    Returns the curated fund table, its names as a ready-made tuple for the
+    comparison selectboxes, and a name-indexed view for O(1) row lookups.
+    """
+    # Hardcoded Example Data for robustness
+    funds = pd.DataFrame({
+        "Fund Name": ["Quant Small Cap Fund", "HDFC Flexi Cap Fund", "Parag Parikh Flexi Cap", "SBI Contra Fund"],
+        "Category": ["Small Cap", "Flexi Cap", "Flexi Cap", "Contra"],
+        "1Y Return": ["45.2%", "28.5%", "24.1%", "32.0%"],
+        "3Y Return": ["38.5%", "22.1%", "20.5%", "29.4%"],
+        "Risk": ["Very High", "High", "Moderate", "High"]
+    })
+    return funds, tuple(funds["Fund Name"].drop_duplicates()), funds.set_index("Fund Name")
 
 # --- 📱 MAIN APP UI ---
 st.sidebar.title("🦁 InvestRight.AI")
@@ -186,13 +394,18 @@ if segment == "🚀 IPO Dashboard":
     
     main_df, sme_df = load_ipo_data()
     
+    # Timestamps are the same for every card in a rerun; format them once
+    now = datetime.datetime.now()
+    gmp_date, last_updated = now.strftime("%d-%b-%Y"), now.strftime("%d-%b-%Y %H:%M")
+    
+    # Fetch the news buzz for every card in parallel instead of card by card
+    ipo_sentiment = prefetch_news_sentiment([*main_df["Company"], *sme_df["Company"]])
+    
     # Tabs for Organization
     tab_main, tab_sme, tab_learn = st.tabs(["🏢 Mainboard IPOs", "🏭 SME IPOs", "📚 Learn IPOs"])
     
     # --- HELPER: GMP CARD GENERATOR ---
     def render_gmp_card(row, is_sme=False):
-        est_price = row['Price'] + row['GMP']
-        est_pct = (row['GMP'] / row['Price']) * 100
         profit_color = "profit-text" if row['GMP'] > 0 else "loss-text"
         
         st.subheader(f"{row['Company']} ({row['Status']})")
@@ -214,30 +427,31 @@ if segment == "🚀 IPO Dashboard":
                 <th>Last Updated</th>
             </tr>
             <tr>
-                <td>{datetime.datetime.now().strftime("%d-%b-%Y")}</td>
+                <td>{gmp_date}</td>
                 <td>₹{row['Price']}</td>
                 <td class="{profit_color}">₹{row['GMP']}</td>
                 <td>{row['Sub']}</td>
                 <td>{row['Sauda']}</td>
-                <td>₹{est_price} ({est_pct:+.2f}%)</td>
-                <td class="{profit_color}">₹{row['GMP'] * row['Lot']} / lot</td>
-                <td>{datetime.datetime.now().strftime("%d-%b-%Y %H:%M")}</td>
+                <td>₹{row['Est_Price']} ({row['GMP_Pct']:+.2f}%)</td>
+                <td class="{profit_color}">₹{row['Lot_Profit']} / lot</td>
+                <td>{last_updated}</td>
             </tr>
         </table>
         """, unsafe_allow_html=True)
         
         # 2. Buzz & Sentiment Section
         st.markdown("##### 🧠 AI Sentiment & Buzz")
-        sentiment = get_news_sentiment(row['Company'])
+        sentiment = ipo_sentiment[row['Company']]
         
-        if sentiment:
+        if sentiment["status"] == "ok":
             c1, c2 = st.columns([1, 3])
             c1.metric("Market Mood", sentiment['rating'])
             c1.progress(sentiment['score']/100)
+            if sentiment.get("stale"): c1.caption("⏳ Live refresh failed; showing last known buzz.")
             
-            with c2:
-                for n in sentiment['news'][:2]:
-                    st.markdown(f"• [{n['Title']}]({n['Link']})")
+            c2.markdown("  \n".join(f"• [{n['Title']}]({n['Link']})" for n in sentiment['news'][:2]))
+        elif sentiment["status"] == "error":
+            st.warning("News temporarily unavailable; buzz will refresh shortly.")
         else:
             st.info("No active social buzz found for this IPO yet.")
 
@@ -246,13 +460,13 @@ if segment == "🚀 IPO Dashboard":
     # --- TAB 1: MAINBOARD ---
     with tab_main:
         st.info("💡 **Jan 2026 Snapshot:** Shadowfax listing expected on Jan 28.")
-        for index, row in main_df.iterrows():
+        for row in main_df.to_dict("records"):
             render_gmp_card(row)
 
     # --- TAB 2: SME ---
     with tab_sme:
         st.info("💡 **Active SME:** Shayona Engineering & Hannah Joseph Hospital Open.")
-        for index, row in sme_df.iterrows():
+        for row in sme_df.to_dict("records"):
             render_gmp_card(row, is_sme=True)
 
     # --- TAB 3: LEARN (Beginner Guide) ---
@@ -292,14 +506,7 @@ elif segment == "💰 Mutual Funds":
     with mf_tab1:
         st.subheader("Top Rated Funds (Jan 2026)")
         
-        # Hardcoded Example Data for robustness
-        funds = pd.DataFrame({
-            "Fund Name": ["Quant Small Cap Fund", "HDFC Flexi Cap Fund", "Parag Parikh Flexi Cap", "SBI Contra Fund"],
-            "Category": ["Small Cap", "Flexi Cap", "Flexi Cap", "Contra"],
-            "1Y Return": ["45.2%", "28.5%", "24.1%", "32.0%"],
-            "3Y Return": ["38.5%", "22.1%", "20.5%", "29.4%"],
-            "Risk": ["Very High", "High", "Moderate", "High"]
-        })
+        funds, fund_names, funds_by_name = load_fund_data()
         
         col1, col2 = st.columns([2, 1])
         with col1:
@@ -307,13 +514,11 @@ elif segment == "💰 Mutual Funds":
         
         with col2:
             st.subheader("Compare Funds")
-            f1 = st.selectbox("Fund A", funds["Fund Name"])
-            f2 = st.selectbox("Fund B", funds["Fund Name"], index=1)
+            f1 = st.selectbox("Fund A", fund_names)
+            f2 = st.selectbox("Fund B", fund_names, index=1)
             if st.button("Compare"):
-                row1 = funds[funds["Fund Name"] == f1].iloc[0]
-                row2 = funds[funds["Fund Name"] == f2].iloc[0]
                 st.write(f"**{f1}** vs **{f2}**")
-                st.table(pd.DataFrame([row1, row2]).set_index("Fund Name"))
+                st.table(funds_by_name.loc[[f1, f2]])
 
     # --- TAB 2: SIP CALCULATOR ---
     with mf_tab2:
@@ -374,12 +579,13 @@ elif segment == "📈 Equity (Stocks)":
         # 1. Buzz & Sentiment
         st.markdown("##### 🧠 Social Sentiment & Buzz")
         sentiment = get_news_sentiment(ticker)
-        if sentiment:
+        if sentiment["status"] == "ok":
             sc1, sc2 = st.columns([1, 3])
             sc1.metric("Sentiment Score", f"{sentiment['score']}/100", sentiment['rating'])
-            with sc2:
-                for n in sentiment['news'][:2]:
-                    st.markdown(f"• [{n['Title']}]({n['Link']}) - *{n['Date'][:16]}*")
+            if sentiment.get("stale"): sc1.caption("⏳ Live refresh failed; showing last known news.")
+            sc2.markdown("  \n".join(f"• [{n['Title']}]({n['Link']}) - *{n['Date'][:16]}*" for n in sentiment['news'][:2]))
+        elif sentiment["status"] == "error":
+            st.error("News temporarily unavailable; try again shortly.")
         else:
             st.warning("No recent high-impact news found.")
             
@@ -425,3 +631,17 @@ elif segment == "📈 Equity (Stocks)":
 # --- FOOTER ---
 st.markdown("---")
 st.caption("© 2026 InvestRight.AI | Data simulated for January 2026 Demo Context.")
+
+# Rendered last so the stats include this rerun's calls
+with st.sidebar.expander("⚙️ Cache stats"):
+    cache_log = pd.DataFrame(list(get_cache_log()), columns=["Function", "Seconds", "Error"])
+    if cache_log.empty:
+        st.caption("No cached calls recorded yet.")
+    else:
+        # Raised calls are never cached, so they count as neither hits nor misses
+        cache_log["Hit"] = (cache_log["Seconds"] < CACHE_HIT_SECS) & ~cache_log["Error"]
+        misses = cache_log[~cache_log["Hit"] & ~cache_log["Error"]].groupby("Function")["Seconds"].mean() * 1000
+        cache_stats = cache_log.groupby("Function").agg(
+            Calls=("Hit", "size"), Hits=("Hit", "sum"), Errors=("Error", "sum"))
+        cache_stats["Avg Miss (ms)"] = misses.reindex(cache_stats.index).fillna(0).round(1)
+        st.dataframe(cache_stats, width="stretch")